@@ -0,0 +1,164 @@
+from dotenv import load_dotenv
+from functools import lru_cache
+import os
+import urllib.parse
+import logging
+import asyncio
+
+import httpx
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+# ============================================
+# Configuração básica
+# ============================================
+
+load_dotenv()
+
+logger = logging.getLogger("taskpoint-intents-api")
+logging.basicConfig(level=logging.INFO)
+
+server = os.getenv("DB_SERVER")
+database = os.getenv("DB_NAME")
+username = os.getenv("DB_USER")
+password = os.getenv("DB_PASSWORD")
+driver = os.getenv("DB_DRIVER")
+openai_api_key = os.getenv("OPENAI_API_KEY")
+
+if not all([server, database, username, password, driver, openai_api_key]):
+    raise RuntimeError("Variáveis de ambiente DB_* ou OPENAI_API_KEY não configuradas.")
+
+# Pool de conexões do SQLAlchemy (por processo/worker).
+db_pool_size = int(os.getenv("DB_POOL_SIZE", "20"))
+db_max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+db_pool_timeout = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+db_pool_recycle = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Linhas buscadas por lote nas consultas que podem devolver muitas linhas.
+db_fetch_batch_size = int(os.getenv("DB_FETCH_BATCH_SIZE", "500"))
+
+# Modelo usado na classificação de intents e na resposta natural.
+llm_model = "gpt-4o-mini"
+
+# Máximo de chamadas simultâneas à OpenAI por worker.
+llm_max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+
+
+# ============================================
+# Banco de dados
+# ============================================
+
+def create_engine() -> AsyncEngine:
+    encoded_password = urllib.parse.quote_plus(str(password))
+    encoded_driver = urllib.parse.quote_plus(str(driver))
+
+    # aioodbc: mesmo driver ODBC, mas as chamadas ao banco são aguardadas no
+    # event loop em vez de ocupar uma thread do pool do asyncio por request.
+    db_uri = (
+        f"mssql+aioodbc://{username}:{encoded_password}"
+        f"@{server}/{database}?driver={encoded_driver}"
+        "&TrustServerCertificate=no"
+    )
+    engine = create_async_engine(
+        db_uri,
+        pool_size=db_pool_size,
+        max_overflow=db_max_overflow,
+        pool_timeout=db_pool_timeout,
+        # Descarta conexões mortas antes de usar e recicla antes do idle
+        # timeout do Azure SQL derrubar a sessão TCP.
+        pool_pre_ping=True,
+        pool_recycle=db_pool_recycle,
+        fast_executemany=True,
+    )
+    logger.info("Conexão com o banco configurada.")
+    return engine
+
+
+@lru_cache(maxsize=1)
+def get_engine() -> AsyncEngine:
+    """
+    Engine/pool único por processo. A primeira chamada acontece no lifespan
+    do FastAPI (após o fork do Gunicorn), então cada worker tem o seu pool
+    em vez de herdar sockets do processo master.
+    """
+    return create_engine()
+
+
+async def ping_database() -> None:
+    async with get_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def warm_up_database() -> None:
+    """
+    Abre as conexões do pool antes do primeiro request: N pings simultâneos
+    forçam o pool a criar N conexões (TCP + TLS + login no SQL Server), que
+    depois ficam ociosas esperando o /chat.
+    """
+    logger.info(f"Aquecendo pool de conexões ({db_pool_size} conexões)...")
+    try:
+        await asyncio.gather(*(ping_database() for _ in range(db_pool_size)))
+        logger.info("Pool de conexões aquecido.")
+    except Exception as e:
+        logger.exception(f"Falha ao aquecer o pool de conexões: {e}")
+
+
+async def dispose_database() -> None:
+    if get_engine.cache_info().currsize:
+        await get_engine().dispose()
+        get_engine.cache_clear()
+
+
+# ============================================
+# LLM
+# ============================================
+
+# Com /chat totalmente assíncrono um worker pode disparar quantas chamadas
+# quiser; o semáforo limita a concorrência para não estourar rate limit da
+# OpenAI e deixa o excedente esperando na fila do próprio worker.
+llm_semaphore = asyncio.Semaphore(llm_max_concurrency)
+
+
+@lru_cache(maxsize=1)
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Pool HTTP compartilhado por todas as chamadas à OpenAI do worker. Com
+    HTTP/2 as requisições simultâneas são multiplexadas na mesma conexão TLS.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_llm() -> ChatOpenAI:
+    """
+    Cliente ChatOpenAI único, criado no primeiro uso. Classificação de intent
+    e resposta natural usam a mesma configuração, então não há motivo para
+    dois clientes (e dois pools de conexão).
+    """
+    return ChatOpenAI(
+        model=llm_model,
+        temperature=0,
+        openai_api_key=openai_api_key,
+        http_async_client=get_http_client(),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> OpenAIEmbeddings:
+    """Embeddings para o cache semântico de intents (mesmo pool HTTP do LLM)."""
+    return OpenAIEmbeddings(
+        model="text-embedding-3-small",
+        openai_api_key=openai_api_key,
+        http_async_client=get_http_client(),
+    )
+
+
+async def close_llm() -> None:
+    if get_http_client.cache_info().currsize:
+        await get_http_client().aclose()
+        get_http_client.cache_clear()
+        get_llm.cache_clear()
+        get_embeddings.cache_clear()
@@ -0,0 +1,20 @@
+import os
+
+# Carregado automaticamente pelo Gunicorn (gunicorn.conf.py no diretório atual).
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# A carga é I/O-bound (espera OpenAI e SQL Server), então vale usar mais
+# workers que CPUs. Cada worker abre seu próprio pool no lifespan do FastAPI.
+# WEB_CONCURRENCY permite ajustar por ambiente sem mexer no arquivo.
+workers = int(os.environ.get("WEB_CONCURRENCY", (2 * (os.cpu_count() or 1)) + 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Importa o app uma vez no master: prompts, regex compiladas e SQL montado
+# no import são compartilhados pelos workers via copy-on-write. Engine,
+# cliente HTTP e caches só são criados depois do fork.
+preload_app = True
+
+keepalive = 75
+# Chamadas ao LLM podem levar alguns segundos; o default (30s) é apertado.
+timeout = 120
@@ -0,0 +1,27 @@
+-- Índices para a consulta de GET_ABSENT_EMPLOYEES (ABSENT_EMPLOYEES_SQL em api.py).
+--
+-- O NOT EXISTS filtra SomaHorasPeriodo por PessoaId + faixa de DataHoraRegistro,
+-- então (PessoaId, DataHoraRegistro) permite um seek por funcionário em vez de
+-- varrer a tabela. Em VinculoTrabalho o INCLUDE cobre as colunas lidas pela
+-- consulta, evitando key lookups.
+--
+-- Idempotente: pode ser executado mais de uma vez.
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_SomaHorasPeriodo_PessoaId_DataHoraRegistro'
+      AND object_id = OBJECT_ID('dbo.SomaHorasPeriodo')
+)
+    CREATE INDEX [IX_SomaHorasPeriodo_PessoaId_DataHoraRegistro]
+        ON [dbo].[SomaHorasPeriodo] ([PessoaId], [DataHoraRegistro]);
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_VinculoTrabalho_PessoaId_Ativo'
+      AND object_id = OBJECT_ID('dbo.VinculoTrabalho')
+)
+    CREATE INDEX [IX_VinculoTrabalho_PessoaId_Ativo]
+        ON [dbo].[VinculoTrabalho] ([PessoaId], [Ativo])
+        INCLUDE ([DataAdmissao], [DataDesligamento]);
+GO
@@ -3,4 +3,4 @@ echo "Instalando dependências..."
 pip install -r requirements.txt
 
 echo "Iniciando Gunicorn com UvicornWorker..."
-exec gunicorn -w 4 -k uvicorn.workers.UvicornWorker api:app
\ No newline at end of file
+exec gunicorn -c gunicorn.conf.py api:app
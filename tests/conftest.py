@@ -0,0 +1,9 @@
+import os
+import sys
+
+# core.py exige as variáveis de banco/OpenAI no import; nos testes nada
+# chega a conectar, então valores fictícios bastam.
+for name in ("DB_SERVER", "DB_NAME", "DB_USER", "DB_PASSWORD", "DB_DRIVER", "OPENAI_API_KEY"):
+    os.environ.setdefault(name, "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import api
+
+
+def reset(token):
+    return asyncio.run(api.reset_cache(x_admin_token=token))
+
+
+def test_reset_cache_disabled_without_configured_token(monkeypatch):
+    monkeypatch.setattr(api, "admin_token", None)
+    with pytest.raises(HTTPException) as exc:
+        reset("")
+    assert exc.value.status_code == 403
+
+
+@pytest.mark.parametrize("token", [None, "", "errado"])
+def test_reset_cache_rejects_wrong_token(monkeypatch, token):
+    monkeypatch.setattr(api, "admin_token", "segredo")
+    with pytest.raises(HTTPException) as exc:
+        reset(token)
+    assert exc.value.status_code == 403
+
+
+def test_reset_cache_accepts_configured_token(monkeypatch):
+    monkeypatch.setattr(api, "admin_token", "segredo")
+    monkeypatch.setattr(api, "intent_cache_db", None)
+    assert reset("segredo") == {"status": "ok"}
@@ -0,0 +1,37 @@
+import asyncio
+
+import api
+from api import QuestionRequest, IntentDto
+
+
+async def read_events(response):
+    return [chunk async for chunk in response.body_iterator]
+
+
+def test_llm_failure_mid_stream_sends_error_then_done(monkeypatch):
+    intent = IntentDto(intent="GET_ABSENT_EMPLOYEES", employee_scope="ALL")
+
+    async def fake_classify(question, user):
+        return intent
+
+    async def fake_execute(intent, user, limit, offset):
+        return [{"Nome": "João"}]
+
+    async def failing_stream(question, intent, raw_result):
+        yield "Hoje "
+        raise RuntimeError("OpenAI fora")
+
+    monkeypatch.setattr(api, "classify_intent", fake_classify)
+    monkeypatch.setattr(api, "execute_intent", fake_execute)
+    monkeypatch.setattr(api, "stream_natural_response", failing_stream)
+
+    async def scenario():
+        response = await api.chat(QuestionRequest(question="quem faltou?", role="RH_ADMIN"), stream=True)
+        return await read_events(response)
+
+    events = asyncio.run(scenario())
+
+    assert events[0].startswith("event: meta\n")
+    assert events[1] == 'data: {"delta":"Hoje "}\n\n'
+    assert events[2].startswith("event: error\n")
+    assert events[3] == "event: done\ndata: {}\n\n"
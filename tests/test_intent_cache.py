@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+import api
+from api import AuthenticatedUser, IntentDto, UserRole, mentions_date, normalize_question
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "quem faltou ontem?",
+        "quem faltou hoje?",
+        "quem falta amanhã?",
+        "quem faltou na semana passada?",
+        "quem faltou na sexta?",
+        "quem faltou em 15/03?",
+        "quem faltou em março?",
+    ],
+)
+def test_date_words_are_detected(question):
+    assert mentions_date(normalize_question(question))
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "qual meu saldo de horas?",
+        "quando eu tiro férias?",
+        "quem não veio trabalhar?",
+    ],
+)
+def test_questions_without_dates(question):
+    assert not mentions_date(normalize_question(question))
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    calls = []
+
+    async def fake_classify(question, role):
+        calls.append(question)
+        return IntentDto(intent="GET_ABSENT_EMPLOYEES", employee_scope="ALL")
+
+    monkeypatch.setattr(api, "classify_intent_with_llm", fake_classify)
+    monkeypatch.setattr(api, "intent_cache_db", None)
+    api._intent_cache.clear()
+    return calls
+
+
+HR_USER = AuthenticatedUser(pessoa_id=None, name="RH", role=UserRole.RH_ADMIN)
+
+
+def test_repeated_question_is_served_from_l1(llm_calls):
+    for _ in range(2):
+        asyncio.run(api.classify_intent("quem não veio trabalhar?", HR_USER))
+    assert len(llm_calls) == 1
+
+
+def test_question_with_date_is_cached_per_day(monkeypatch, llm_calls):
+    monkeypatch.setattr(api, "today_iso", lambda: "2026-03-16")
+    for _ in range(2):
+        asyncio.run(api.classify_intent("quem faltou ontem?", HR_USER))
+    assert len(llm_calls) == 1
+
+    # No dia seguinte "ontem" é outra data: classifica de novo.
+    monkeypatch.setattr(api, "today_iso", lambda: "2026-03-17")
+    asyncio.run(api.classify_intent("quem faltou ontem?", HR_USER))
+    assert len(llm_calls) == 2
+
+
+def test_question_without_date_ignores_the_day(monkeypatch, llm_calls):
+    for day in ("2026-03-16", "2026-03-17"):
+        monkeypatch.setattr(api, "today_iso", lambda: day)
+        asyncio.run(api.classify_intent("quem não veio trabalhar?", HR_USER))
+    assert len(llm_calls) == 1
+
+
+def test_intent_prompt_carries_todays_date(monkeypatch):
+    prompts = []
+
+    class FakeClassifier:
+        async def ainvoke(self, messages):
+            prompts.append(messages[-1].content)
+            return IntentDto(intent="GET_ABSENT_EMPLOYEES", employee_scope="ALL")
+
+    monkeypatch.setattr(api, "today_iso", lambda: "2026-03-16")
+    monkeypatch.setattr(api, "get_intent_classifier", lambda: FakeClassifier())
+    asyncio.run(api.classify_intent_with_llm("quem faltou ontem?", UserRole.RH_ADMIN))
+
+    assert prompts[0].startswith("Hoje: 2026-03-16\n")
+
+
+def test_l1_expires_within_a_day():
+    assert api._intent_cache.ttl <= 86400
+
+
+def test_l2_key_changes_with_the_cache_version(monkeypatch):
+    before = api.intent_l2_key("quem faltou", UserRole.RH_ADMIN)
+    monkeypatch.setattr(api, "INTENT_CACHE_VERSION", "outro-prompt")
+    assert api.intent_l2_key("quem faltou", UserRole.RH_ADMIN) != before
+
+
+def test_l2_round_trip_without_wal(monkeypatch, tmp_path):
+    monkeypatch.setattr(api, "intent_cache_db", str(tmp_path / "intents.db"))
+    monkeypatch.setattr(api, "_intent_l2_local", api.threading.local())
+
+    key = api.intent_l2_key("quem faltou", UserRole.RH_ADMIN)
+    api.intent_l2_set(key, '{"intent": "GET_ABSENT_EMPLOYEES"}')
+
+    assert api.intent_l2_get(key) == '{"intent": "GET_ABSENT_EMPLOYEES"}'
+    journal = api.intent_l2_connection().execute("PRAGMA journal_mode").fetchone()[0]
+    assert journal.lower() != "wal"
+
+
+def test_third_party_question_skips_the_semantic_cache(monkeypatch, llm_calls):
+    embedded = []
+
+    async def fake_embed(question):
+        embedded.append(question)
+        return None
+
+    monkeypatch.setattr(api, "semantic_intent_cache_enabled", True)
+    monkeypatch.setattr(api, "embed_question", fake_embed)
+
+    asyncio.run(api.classify_intent("qual o saldo do joao?", HR_USER))
+    asyncio.run(api.classify_intent("quem não veio trabalhar?", HR_USER))
+
+    assert embedded == ["quem não veio trabalhar?"]
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import api
+from api import AuthenticatedUser, IntentDto, UserRole
+
+MANAGER = AuthenticatedUser(pessoa_id=None, name="Gestor", role=UserRole.MANAGER)
+VACATION_ONE = IntentDto(
+    intent="GET_NEXT_VACATION_PERIOD", employee_scope="ONE", target_employee_name="Maria"
+)
+BANK_HOURS_ONE = IntentDto(
+    intent="GET_EMPLOYEE_BANK_HOURS", employee_scope="ONE", target_employee_name="Maria"
+)
+
+
+def fake_run_raw(monkeypatch, rows):
+    async def run_raw(statement, params, stream=False):
+        return rows
+
+    monkeypatch.setattr(api, "run_raw", run_raw)
+
+
+def test_unknown_person_is_404(monkeypatch):
+    fake_run_raw(monkeypatch, [])
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(api.handle_get_next_vacation_period(VACATION_ONE, MANAGER))
+    assert exc.value.status_code == 404
+
+
+def test_person_without_upcoming_vacation_gets_the_empty_reply(monkeypatch):
+    fake_run_raw(monkeypatch, [{"PessoaId": "x", "Nome": "Maria", "DataInicio": None, "DataFim": None}])
+
+    result = asyncio.run(api.handle_get_next_vacation_period(VACATION_ONE, MANAGER))
+
+    assert result == []
+    response = asyncio.run(api.build_natural_response("quando a Maria tira férias?", VACATION_ONE, result))
+    assert response == api.EMPTY_RESULT_RESPONSES["GET_NEXT_VACATION_PERIOD"]
+
+
+def test_person_without_bank_hours_row_gets_the_empty_reply(monkeypatch):
+    fake_run_raw(monkeypatch, [{"BancoHorasId": None, "PessoaId": "x", "Nome": "Maria", "Saldo": None}])
+
+    result = asyncio.run(api.handle_get_employee_bank_hours(BANK_HOURS_ONE, MANAGER))
+
+    assert result == []
+    assert api.is_empty_result(result)
+
+
+def test_person_with_vacation_returns_it(monkeypatch):
+    row = {"PessoaId": "x", "Nome": "Maria", "DataInicio": "2026-12-01", "DataFim": "2026-12-20"}
+    fake_run_raw(monkeypatch, [row])
+
+    assert asyncio.run(api.handle_get_next_vacation_period(VACATION_ONE, MANAGER)) == [row]
@@ -0,0 +1,42 @@
+import pytest
+
+from api import classify_intent_by_keywords, normalize_question
+
+
+def classify(question: str):
+    return classify_intent_by_keywords(question, normalize_question(question))
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("qual meu saldo de horas?", "GET_EMPLOYEE_BANK_HOURS"),
+        ("quantas horas eu tenho na casa?", "GET_EMPLOYEE_BANK_HOURS"),
+        ("qual o meu saldo do banco de horas?", "GET_EMPLOYEE_BANK_HOURS"),
+        ("quando eu tiro férias?", "GET_NEXT_VACATION_PERIOD"),
+        ("minhas férias", "GET_NEXT_VACATION_PERIOD"),
+        ("qual meu horário hoje?", "GET_EMPLOYEE_TODAY_SCHEDULE"),
+        ("que horas eu entro e saio?", "GET_EMPLOYEE_TODAY_SCHEDULE"),
+    ],
+)
+def test_first_person_questions_resolve_as_self(question, expected):
+    intent = classify(question)
+    assert intent is not None
+    assert intent.intent == expected
+    assert intent.employee_scope == "SELF"
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "qual o saldo do joao? meu chefe pediu",
+        "quando o carlos tira ferias? eu preciso saber",
+        "saldo da minha equipe",
+        "meu gestor quer saber o horario da equipe",
+        "qual o saldo de horas da maria",
+        "qual o saldo de horas?",
+        "quem faltou hoje? eu preciso saber",
+    ],
+)
+def test_questions_about_others_fall_through_to_llm(question):
+    assert classify(question) is None
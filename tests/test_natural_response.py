@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+
+import api
+from api import IntentDto
+
+
+class FakeLLM:
+    def __init__(self, content: str):
+        self.content = content
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        return SimpleNamespace(content=self.content)
+
+    async def astream(self, prompt):
+        self.calls += 1
+        for word in self.content.split(" "):
+            yield SimpleNamespace(content=word + " ")
+
+
+BANK_HOURS_INTENT = IntentDto(intent="GET_EMPLOYEE_BANK_HOURS", employee_scope="SELF")
+BANK_HOURS_RESULT = {
+    "saldo": {"BancoHorasId": 1, "Nome": "Maria", "Saldo": 12.5},
+    "recent": [],
+}
+
+
+def test_bank_hours_with_balance_is_not_empty():
+    assert not api.is_empty_result(BANK_HOURS_RESULT)
+
+
+def test_bank_hours_without_balance_is_empty():
+    assert api.is_empty_result([])
+    assert api.is_empty_result({"saldo": None, "recent": []})
+
+
+def test_today_schedule_rows_still_checked():
+    assert api.is_empty_result({"sql": "SELECT 1", "rows": []})
+    assert not api.is_empty_result({"sql": "SELECT 1", "rows": [{"Jornada": "Comercial"}]})
+
+
+def test_bank_hours_balance_reaches_the_llm(monkeypatch):
+    llm = FakeLLM("Você tem 12,5 horas acumuladas no seu banco de horas.")
+    monkeypatch.setattr(api, "get_llm", lambda: llm)
+    api._natural_response_cache.clear()
+
+    response = asyncio.run(
+        api.build_natural_response("qual meu saldo?", BANK_HOURS_INTENT, BANK_HOURS_RESULT)
+    )
+
+    assert llm.calls == 1
+    assert response == "Você tem 12,5 horas acumuladas no seu banco de horas."
+    assert response != api.EMPTY_RESULT_RESPONSES["GET_EMPLOYEE_BANK_HOURS"]
+
+
+def test_slow_stream_consumer_does_not_hold_the_llm_slot(monkeypatch):
+    llm = FakeLLM("Você tem 12,5 horas acumuladas.")
+    monkeypatch.setattr(api, "get_llm", lambda: llm)
+    api._natural_response_cache.clear()
+
+    async def scenario():
+        semaphore = asyncio.Semaphore(1)
+        monkeypatch.setattr(api, "llm_semaphore", semaphore)
+        stream = api.stream_natural_response("qual meu saldo?", BANK_HOURS_INTENT, BANK_HOURS_RESULT)
+
+        first = await stream.__anext__()
+        # O consumidor para de ler; o stream da OpenAI termina e libera a vaga.
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert not semaphore.locked()
+
+        rest = [delta async for delta in stream]
+        return first + "".join(rest)
+
+    assert asyncio.run(scenario()).strip() == "Você tem 12,5 horas acumuladas."